@@ -0,0 +1,27 @@
+"""
+Shared constants for the sentiment tracker
+"""
+
+# Premier League teams with name variations
+PREMIER_LEAGUE_TEAMS = {
+    'Manchester City': ['Manchester City', 'Man City', 'MCFC', 'City'],
+    'Arsenal': ['Arsenal', 'Gunners', 'AFC'],
+    'Liverpool': ['Liverpool', 'LFC', 'Reds'],
+    'Manchester United': ['Manchester United', 'Man United', 'Man Utd', 'MUFC', 'United'],
+    'Chelsea': ['Chelsea', 'CFC', 'Blues'],
+    'Tottenham': ['Tottenham', 'Spurs', 'THFC'],
+    'Newcastle': ['Newcastle', 'Newcastle United', 'NUFC'],
+    'Brighton': ['Brighton', 'Brighton & Hove Albion', 'Seagulls'],
+    'Aston Villa': ['Aston Villa', 'Villa', 'AVFC'],
+    'West Ham': ['West Ham', 'West Ham United', 'Hammers'],
+    'Fulham': ['Fulham', 'FFC'],
+    'Brentford': ['Brentford', 'Bees'],
+    'Crystal Palace': ['Crystal Palace', 'Palace', 'CPFC', 'Eagles'],
+    'Nottingham Forest': ['Nottingham Forest', 'Forest', 'NFFC'],
+    'Everton': ['Everton', 'EFC', 'Toffees'],
+    'Bournemouth': ['Bournemouth', 'AFC Bournemouth', 'Cherries'],
+    'Wolves': ['Wolves', 'Wolverhampton', 'Wanderers'],
+    'Leicester': ['Leicester', 'Leicester City', 'LCFC', 'Foxes'],
+    'Ipswich': ['Ipswich', 'Ipswich Town', 'ITFC', 'Tractor Boys'],
+    'Southampton': ['Southampton', 'Saints']
+}
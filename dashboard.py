@@ -6,9 +6,15 @@ import streamlit as st
 from google.cloud import firestore
 from google.oauth2 import service_account
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import hashlib
+import os
 
 # Page config
 st.set_page_config(
@@ -65,22 +71,268 @@ def get_db():
 db = get_db()
 
 # Fetch data
+PAGE_SIZE = 200
+MAX_DOCS = 1000
+
+def fetch_pages(query, page_size=PAGE_SIZE, max_docs=MAX_DOCS):
+    """Walk a query with start_after() cursors, one bounded page at a time"""
+    snapshots = []
+    last = None
+    
+    while len(snapshots) < max_docs:
+        page_query = query.limit(min(page_size, max_docs - len(snapshots)))
+        if last is not None:
+            page_query = page_query.start_after(last)
+        
+        page = list(page_query.stream())
+        snapshots.extend(page)
+        
+        if len(page) < page_size:
+            break
+        last = page[-1]
+    
+    return snapshots
+
+# Fields used by the overview, charts and table; key_topics is loaded separately
+DATA_FIELDS = ['team', 'avg_sentiment', 'article_count', 'timestamp', 'sources']
+
+# Daily documents carry their hourly points as an array of {t, s}; older
+# documents hold a single point in timestamp / avg_sentiment
+QUERY_FIELDS = DATA_FIELDS + ['hourly']
+MAX_ROWS = 10000
+
+# Local parquet cache, one file per days window; the version is bumped when
+# the stored schema or dtypes change so stale files are ignored
+CACHE_VERSION = 2
+CACHE_DIR = Path(__file__).parent / 'cache'
+LIST_COLUMNS = ['sources']
+
+def cache_path(days):
+    return CACHE_DIR / f'sentiment_v{CACHE_VERSION}_{days}.parquet'
+
+def read_cache(days):
+    """Load the cached frame for this window, or an empty frame"""
+    path = cache_path(days)
+    if not path.exists():
+        return pd.DataFrame()
+    
+    try:
+        cached = pd.read_parquet(path, engine='pyarrow', columns=DATA_FIELDS)
+    except Exception:
+        return pd.DataFrame()
+    
+    # Parquet hands list columns back as numpy arrays
+    for col in LIST_COLUMNS:
+        if col in cached.columns:
+            cached[col] = [list(v) if v is not None else None for v in cached[col]]
+    
+    return cached
+
+def write_cache(days, df):
+    """Save the frame for this window; a failed write only skips the cache"""
+    path = cache_path(days)
+    tmp_path = path.with_suffix('.tmp')
+    
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        st.warning(f"Could not write local cache: {e}")
+        try:
+            tmp_path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+def clear_cache():
+    for path in CACHE_DIR.glob('sentiment_*.parquet'):
+        path.unlink(missing_ok=True)
+
+def downcast(df):
+    """
+    Shrink column dtypes; a categorical team makes groupby work on int codes
+    avg_sentiment stays float64 so 3-decimal scores display exactly
+    """
+    df['team'] = df['team'].astype('category')
+    df['avg_sentiment'] = df['avg_sentiment'].astype('float64')
+    df['article_count'] = pd.to_numeric(df['article_count'], downcast='integer')
+    return df
+
+@st.cache_data(ttl=300)
+def load_data(days=14, page_size=PAGE_SIZE):
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
+    cached = read_cache(days)
+    
+    query = db.collection('team_sentiment')\
+        .where(filter=firestore.FieldFilter('timestamp', '>=', cutoff_date))
+    
+    # Only page through documents newer than what is already on disk. Daily
+    # documents are rewritten in place without their timestamp necessarily
+    # moving, so the whole day of the newest cached row is fetched again
+    if not cached.empty:
+        resync_from = cached['timestamp'].max().normalize()
+        query = query.where(filter=firestore.FieldFilter('timestamp', '>=', resync_from.to_pydatetime()))
+    
+    query = query.order_by('timestamp', direction=firestore.Query.DESCENDING)\
+        .select(QUERY_FIELDS)
+    
+    # Build columns directly rather than a list of per-row dicts, one row per
+    # hourly point
+    columns = {field: [] for field in DATA_FIELDS}
+    for snap in fetch_pages(query, page_size):
+        d = snap.to_dict()
+        points = d.get('hourly') or [{'t': d.get('timestamp'), 's': d.get('avg_sentiment')}]
+        for point in points:
+            columns['team'].append(d.get('team'))
+            columns['avg_sentiment'].append(point['s'])
+            columns['article_count'].append(d.get('article_count'))
+            columns['timestamp'].append(point['t'])
+            columns['sources'].append(d.get('sources'))
+    
+    fresh = pd.DataFrame(columns)
+    fresh['timestamp'] = pd.to_datetime(fresh['timestamp'], utc=True)
+    
+    frames = [frame for frame in (fresh, cached) if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    
+    # A daily document that was rewritten comes back with all of its hours,
+    # so fresh rows go first and win the dedupe over cached ones
+    df = pd.concat(frames, ignore_index=True)
+    df = df.drop_duplicates(subset=['team', 'timestamp'])
+    df = df.sort_values('timestamp', ascending=False, kind='stable')
+    df = df[df['timestamp'] >= cutoff_date].head(MAX_ROWS).reset_index(drop=True)
+    df = downcast(df)
+    
+    write_cache(days, df)
+    
+    return df
+
 @st.cache_data(ttl=300)
-def load_data(days=14):
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
+def load_key_topics(latest):
+    """
+    key_topics of each team's latest document, only fetched when a section needs them
+    `latest` holds (team, timestamp) pairs taken from the loaded frame; both
+    filters are equalities, so no composite index is needed
+    """
+    topics = {}
+    for team, timestamp in latest:
+        docs = db.collection('team_sentiment')\
+            .where(filter=firestore.FieldFilter('team', '==', team))\
+            .where(filter=firestore.FieldFilter('timestamp', '==', timestamp.to_pydatetime()))\
+            .select(['key_topics'])\
+            .limit(1)\
+            .stream()
+        
+        for doc in docs:
+            topics[team] = doc.to_dict().get('key_topics') or []
     
-    docs = db.collection('team_sentiment')\
-        .where('timestamp', '>=', cutoff_date)\
-        .order_by('timestamp', direction=firestore.Query.DESCENDING)\
-        .limit(1000)\
-        .stream()
+    return topics
+
+def key_topics_for(agg, teams):
+    """Key topics for the given teams; a failed lookup leaves them empty"""
+    latest = tuple(
+        (team, agg.latest_timestamps[team])
+        for team in teams
+        if team in agg.latest_timestamps.index
+    )
     
-    data = []
-    for doc in docs:
-        d = doc.to_dict()
-        data.append(d)
+    try:
+        return load_key_topics(latest)
+    except Exception as e:
+        st.warning(f"Could not load key topics: {e}")
+        return {}
+
+# Figures are kept per session so a rerun with unchanged filters only swaps
+# trace data and the browser can diff the chart instead of rebuilding it
+def cached_figure(name, key):
+    entry = st.session_state.setdefault('figures', {}).get(name)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    return None
+
+def store_figure(name, key, fig):
+    st.session_state.setdefault('figures', {})[name] = (key, fig)
+
+def frame_digest(df):
+    """Cheap content key for a frame, so cached helpers need not hash it whole"""
+    # Lists are unhashable, so list columns are hashed as tuples
+    hashable = df.assign(**{
+        col: df[col].map(lambda v: tuple(v) if isinstance(v, list) else v)
+        for col in LIST_COLUMNS if col in df.columns
+    })
+    hashed = pd.util.hash_pandas_object(hashable, index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()
+
+@st.cache_data(max_entries=8)
+def csv_bytes(digest, sentiment_filter, _df):
+    """Serialize the filtered frame to CSV with pyarrow, once per distinct frame"""
+    flat = _df.assign(**{col: _df[col].astype(str) for col in ['team'] + LIST_COLUMNS if col in _df.columns})
+    buffer = pa.BufferOutputStream()
+    pa_csv.write_csv(pa.Table.from_pandas(flat, preserve_index=False), buffer)
+    return buffer.getvalue().to_pybytes()
+
+Aggregates = namedtuple('Aggregates', [
+    'df', 'latest', 'sorted_df', 'team_groups', 'trends',
+    'all_teams', 'source_counts', 'articles_per_team', 'latest_timestamps'
+])
+
+@st.cache_data(max_entries=16)
+def aggregate(digest, _df, sentiment_filter):
+    """
+    Apply the sentiment filter and build every per-team aggregate the page uses
+    Keyed on the frame digest and filter, so other widgets never re-aggregate
+    """
+    # Newest timestamp of each team before filtering, which is also the
+    # top-level timestamp of its latest document
+    latest_timestamps = _df.groupby('team', observed=True)['timestamp'].max()
+    
+    df = _df
+    if sentiment_filter == "Positive (>0)":
+        df = df[df['avg_sentiment'] > 0]
+    elif sentiment_filter == "Negative (<0)":
+        df = df[df['avg_sentiment'] < 0]
+    elif sentiment_filter == "Neutral (≈0)":
+        df = df[df['avg_sentiment'].between(-0.1, 0.1)]
     
-    return pd.DataFrame(data)
+    # Latest sentiment for each team
+    latest_idx = df.groupby('team', sort=False, observed=True)['timestamp'].idxmax()
+    latest = df.loc[latest_idx].reset_index(drop=True)
+    latest = latest.sort_values('avg_sentiment', ascending=False)
+    
+    # Per-team slices, each already in timestamp order
+    sorted_df = df.sort_values('timestamp')
+    by_team = sorted_df.groupby('team', sort=False, observed=True)
+    team_groups = {team: group for team, group in by_team}
+    
+    # Trend inputs for the summary report
+    trends = pd.DataFrame({
+        'rows': by_team.size(),
+        'articles': by_team['article_count'].sum(),
+        'recent_avg': by_team.tail(3).groupby('team', sort=False, observed=True)['avg_sentiment'].mean(),
+        'older_avg': by_team.head(3).groupby('team', sort=False, observed=True)['avg_sentiment'].mean()
+    })
+    
+    source_counts = df['sources'].dropna()\
+        .loc[lambda s: s.map(type).eq(list)]\
+        .explode()\
+        .value_counts()
+    
+    articles_per_team = df.groupby('team', observed=True)['article_count'].sum()\
+        .sort_values(ascending=False)\
+        .head(10)
+    
+    return Aggregates(
+        df=df,
+        latest=latest,
+        sorted_df=sorted_df,
+        team_groups=team_groups,
+        trends=trends,
+        all_teams=sorted(df['team'].unique()),
+        source_counts=source_counts,
+        articles_per_team=articles_per_team,
+        latest_timestamps=latest_timestamps
+    )
 
 # Sidebar
 st.sidebar.header("⚙️ Filters & Settings")
@@ -97,105 +349,18 @@ sentiment_filter = st.sidebar.radio(
     ["All", "Positive (>0)", "Negative (<0)", "Neutral (≈0)"]
 )
 
-# Load data
-try:
-    with st.spinner("Loading data from Firestore..."):
-        df = load_data(days=days_filter)
-    
-    if df.empty:
-        st.warning("⏳ No data yet. The Cloud Function needs to run at least once.")
-        st.info("""
-        **Next steps:**
-        1. Trigger your Cloud Function manually or wait for scheduled run
-        2. Check Firestore console to verify data is being stored
-        3. Refresh this dashboard
-        """)
-        st.stop()
-    
-    # Apply sentiment filter
-    if sentiment_filter == "Positive (>0)":
-        df = df[df['avg_sentiment'] > 0]
-    elif sentiment_filter == "Negative (<0)":
-        df = df[df['avg_sentiment'] < 0]
-    elif sentiment_filter == "Neutral (≈0)":
-        df = df[df['avg_sentiment'].between(-0.1, 0.1)]
-    
-    # Get latest sentiment for each team
-    latest_sentiment = df.sort_values('timestamp').groupby('team').last().reset_index()
-    latest_sentiment = latest_sentiment.sort_values('avg_sentiment', ascending=False)
-    
-    # === OVERVIEW METRICS ===
-    st.subheader("📊 Overview")
-    
-    col1, col2, col3, col4, col5 = st.columns(5)
-    
-    with col1:
-        st.metric("🏆 Teams Tracked", len(latest_sentiment))
-    
-    with col2:
-        if not latest_sentiment.empty:
-            most_positive = latest_sentiment.iloc[0]
-            st.metric(
-                "😊 Most Positive",
-                most_positive['team'],
-                delta=f"+{most_positive['avg_sentiment']:.2f}"
-            )
-    
-    with col3:
-        if not latest_sentiment.empty:
-            most_negative = latest_sentiment.iloc[-1]
-            st.metric(
-                "😔 Most Negative",
-                most_negative['team'],
-                delta=f"{most_negative['avg_sentiment']:.2f}"
-            )
-    
-    with col4:
-        avg_sentiment = latest_sentiment['avg_sentiment'].mean()
-        st.metric("📈 League Average", f"{avg_sentiment:.2f}")
-    
-    with col5:
-        total_articles = df['article_count'].sum()
-        st.metric("📝 Total Articles", f"{total_articles:,}")
-    
-    st.markdown("---")
-    
-    # === SENTIMENT RANKINGS ===
-    st.subheader("🏅 Current Sentiment Rankings")
-    
-    colors = ['#00D9A3' if x > 0.1 else '#FF4B4B' if x < -0.1 else '#FFA500' 
-              for x in latest_sentiment['avg_sentiment']]
-    
-    fig_bar = go.Figure()
-    
-    fig_bar.add_trace(go.Bar(
-        y=latest_sentiment['team'],
-        x=latest_sentiment['avg_sentiment'],
-        orientation='h',
-        marker=dict(color=colors),
-        text=latest_sentiment['avg_sentiment'].round(3),
-        textposition='outside'
-    ))
-    
-    fig_bar.update_layout(
-        title="Team Sentiment Scores (Latest)",
-        xaxis_title="Sentiment Score",
-        yaxis_title="",
-        height=max(600, len(latest_sentiment) * 30),
-        showlegend=False,
-        yaxis={'categoryorder': 'total ascending'}
-    )
-    
-    fig_bar.add_vline(x=0, line_dash="dash", line_color="gray", opacity=0.3)
-    
-    st.plotly_chart(fig_bar, use_container_width=True)
-    
-    st.markdown("---")
+@st.fragment
+def render_team_comparison(agg, days_filter, sentiment_filter):
+    """Trends, key topics and AI summary for the selected teams"""
+    df = agg.df
+    latest_sentiment = agg.latest
+    sorted_df = agg.sorted_df
+    team_groups = agg.team_groups
     
     # === TEAM COMPARISON ===
     st.subheader("📈 Team Sentiment Trends")
 
-    all_teams = sorted(df['team'].unique())
+    all_teams = agg.all_teams
     default_teams = latest_sentiment.head(6)['team'].tolist()
 
     selected_teams = st.multiselect(
@@ -205,9 +370,7 @@ try:
     )
 
     if selected_teams:
-        team_df = df[df['team'].isin(selected_teams)].copy()
-        team_df['timestamp'] = pd.to_datetime(team_df['timestamp'])
-        team_df = team_df.sort_values('timestamp')
+        team_df = sorted_df[sorted_df['team'].isin(selected_teams)]
         
         # Check if we have enough data points
         unique_times = team_df['timestamp'].nunique()
@@ -223,31 +386,60 @@ try:
             
             # Show current values instead
             st.subheader("Current Sentiment Values")
-            current_df = team_df.groupby('team')['avg_sentiment'].last().reset_index()
+            current_df = team_df.groupby('team', observed=True)['avg_sentiment'].last().reset_index()
             current_df = current_df.sort_values('avg_sentiment', ascending=False)
             
-            fig_bar = px.bar(
-                current_df,
-                x='team',
-                y='avg_sentiment',
-                color='avg_sentiment',
-                color_continuous_scale=['red', 'yellow', 'green'],
-                title='Current Sentiment Scores'
+            scores = current_df['avg_sentiment'].to_numpy()
+            fig_bar = go.Figure(go.Bar(
+                x=current_df['team'].to_numpy(),
+                y=scores,
+                marker=dict(
+                    color=scores,
+                    colorscale=['red', 'yellow', 'green'],
+                    colorbar=dict(title='avg_sentiment')
+                )
+            ))
+            fig_bar.update_layout(
+                title='Current Sentiment Scores',
+                xaxis_title='team',
+                yaxis_title='avg_sentiment'
             )
             fig_bar.add_hline(y=0, line_dash="dash", line_color="white", opacity=0.5)
             st.plotly_chart(fig_bar, use_container_width=True)
             
         else:
             # Show trend line chart
-            fig_line = px.line(
-                team_df,
-                x='timestamp',
-                y='avg_sentiment',
-                color='team',
-                title=f'Sentiment Over Time ({unique_times} data points)',
-                labels={'avg_sentiment': 'Sentiment Score', 'timestamp': 'Time'},
-                markers=True
-            )
+            trend_key = (days_filter, sentiment_filter, tuple(selected_teams))
+            fig_line = cached_figure('trend', trend_key)
+            
+            if fig_line is None:
+                fig_line = go.Figure()
+                
+                for team, group in team_df.groupby('team', sort=False, observed=True):
+                    fig_line.add_trace(go.Scattergl(
+                        x=group['timestamp'].to_numpy(),
+                        y=group['avg_sentiment'].to_numpy(),
+                        mode='lines+markers',
+                        name=team
+                    ))
+                
+                fig_line.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.3, annotation_text="Neutral")
+                fig_line.update_layout(
+                    height=500,
+                    xaxis_title='Time',
+                    yaxis_title='Sentiment Score',
+                    legend_title_text='team',
+                    hovermode='x unified',
+                    legend=dict(orientation="v", yanchor="top", y=1, xanchor="left", x=1.02)
+                )
+                store_figure('trend', trend_key, fig_line)
+            else:
+                for trace in fig_line.data:
+                    group = team_groups[trace.name]
+                    trace.x = group['timestamp'].to_numpy()
+                    trace.y = group['avg_sentiment'].to_numpy()
+            
+            fig_line.update_layout(title=f'Sentiment Over Time ({unique_times} data points)')
             
             # Format x-axis based on data span
             time_span = (team_df['timestamp'].max() - team_df['timestamp'].min()).total_seconds()
@@ -259,28 +451,21 @@ try:
             else:  # More than 1 week - show dates
                 fig_line.update_xaxes(tickformat='%b %d')
             
-            fig_line.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.3, annotation_text="Neutral")
-            fig_line.update_layout(
-                height=500,
-                hovermode='x unified',
-                legend=dict(orientation="v", yanchor="top", y=1, xanchor="left", x=1.02)
-            )
-            
-            st.plotly_chart(fig_line, use_container_width=True)
+            st.plotly_chart(fig_line, use_container_width=True, key='trend_chart')
 
     st.markdown("---")
     
     # === KEY TOPICS ===
     st.subheader("🔑 Key Topics & Entities")
     
-    if 'key_topics' in df.columns and selected_teams:
+    if selected_teams:
+        key_topics = key_topics_for(agg, selected_teams)
+        
         for team in selected_teams:
-            team_latest = df[df['team'] == team].sort_values('timestamp').iloc[-1]
+            topics = key_topics.get(team)
             
-            if 'key_topics' in team_latest and team_latest['key_topics']:
+            if topics:
                 with st.expander(f"🔍 {team} - Recent Topics"):
-                    topics = team_latest['key_topics']
-                    
                     if topics:
                         col1, col2, col3 = st.columns([3, 1, 1])
                         with col1:
@@ -312,39 +497,47 @@ try:
         summary_text = f"**Premier League Media Sentiment Analysis**\n\n"
         summary_text += f"*Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')}*\n\n---\n\n"
         
+        # Classify every team's latest score in one pass
+        summary_df = latest_sentiment.set_index('team')
+        scores = summary_df['avg_sentiment'].to_numpy()
+        conditions = [scores > 0.15, scores > 0.05, scores < -0.15, scores < -0.05]
+        
+        summary_df['emoji'] = np.select(conditions, ["🟢", "🟢", "🔴", "🔴"], default="🟡")
+        summary_df['label'] = np.select(
+            conditions,
+            ["very positive", "positive", "very negative", "negative"],
+            default="neutral"
+        )
+        summary_df['explanation'] = np.select(
+            conditions,
+            [
+                "strong performances, victories, and positive developments",
+                "good form, favorable results, or promising developments",
+                "poor results, defensive struggles, managerial pressure, or off-field controversies",
+                "disappointing performances, losses, or tactical concerns"
+            ],
+            default="balanced coverage without strong positive or negative themes"
+        )
+        
+        summary_df = summary_df.join(agg.trends)
+        
+        key_topics = key_topics_for(agg, selected_teams)
+        
         for team in selected_teams:
-            team_df = df[df['team'] == team].sort_values('timestamp')
-            if team_df.empty:
+            if team not in summary_df.index:
                 continue
             
-            latest = team_df.iloc[-1]
-            
-            # Determine sentiment category and explanation
+            latest = summary_df.loc[team]
             score = latest['avg_sentiment']
-            
-            if score > 0.15:
-                emoji, label = "🟢", "very positive"
-                explanation = "strong performances, victories, and positive developments"
-            elif score > 0.05:
-                emoji, label = "🟢", "positive"
-                explanation = "good form, favorable results, or promising developments"
-            elif score < -0.15:
-                emoji, label = "🔴", "very negative"
-                explanation = "poor results, defensive struggles, managerial pressure, or off-field controversies"
-            elif score < -0.05:
-                emoji, label = "🔴", "negative"
-                explanation = "disappointing performances, losses, or tactical concerns"
-            else:
-                emoji, label = "🟡", "neutral"
-                explanation = "balanced coverage without strong positive or negative themes"
+            emoji, label, explanation = latest['emoji'], latest['label'], latest['explanation']
             
             summary_text += f"### {emoji} {team}\n\n"
             
             # Add context from entities if available
-            has_entities = 'key_topics' in latest and latest['key_topics'] and len(latest['key_topics']) > 0
+            team_topics = key_topics.get(team)
             
-            if has_entities:
-                topics = [t['name'] for t in latest['key_topics'][:3]]
+            if team_topics:
+                topics = [t['name'] for t in team_topics[:3]]
                 topic_text = ', '.join(topics[:-1]) + f", and {topics[-1]}" if len(topics) > 1 else topics[0]
                 
                 summary_text += f"{team} is experiencing {label} media coverage ({score:.2f}), "
@@ -353,10 +546,8 @@ try:
                 summary_text += f"{team} shows {label} sentiment ({score:.2f}), indicating {explanation}. "
             
             # Trend analysis
-            if len(team_df) >= 3:
-                recent_avg = team_df.tail(3)['avg_sentiment'].mean()
-                older_avg = team_df.head(3)['avg_sentiment'].mean()
-                change = recent_avg - older_avg
+            if latest['rows'] >= 3:
+                change = latest['recent_avg'] - latest['older_avg']
                 
                 if change > 0.1:
                     summary_text += f"Media perception has improved significantly (+{change:.2f}). "
@@ -367,12 +558,12 @@ try:
                 elif change < -0.03:
                     summary_text += f"Media tone has worsened in recent reports. "
             
-            summary_text += f"Analysis based on {team_df['article_count'].sum()} articles.\n\n---\n\n"
+            summary_text += f"Analysis based on {latest['articles']} articles.\n\n---\n\n"
         
         # Overall insights
         if len(selected_teams) > 1:
             summary_text += "### League Overview\n\n"
-            avg_all = df[df['team'].isin(selected_teams)].groupby('team').last()['avg_sentiment'].mean()
+            avg_all = df[df['team'].isin(selected_teams)].groupby('team', observed=True).last()['avg_sentiment'].mean()
             summary_text += f"Average media sentiment: {avg_all:.2f}\n\n"
         
         st.markdown(summary_text)
@@ -383,62 +574,10 @@ try:
             file_name=f"sentiment_summary_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
             mime="text/plain"
         )
-    
-    # === DATA SOURCES ===
-    st.subheader("📰 Data Sources Breakdown")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        if 'sources' in df.columns:
-            all_sources = []
-            for sources in df['sources']:
-                if isinstance(sources, list):
-                    all_sources.extend(sources)
-            
-            if all_sources:
-                source_counts = pd.Series(all_sources).value_counts()
-                
-                fig_sources = px.pie(
-                    values=source_counts.values,
-                    names=source_counts.index,
-                    title='Articles by Source'
-                )
-                st.plotly_chart(fig_sources, use_container_width=True)
-    
-    with col2:
-        articles_per_team = df.groupby('team')['article_count'].sum().sort_values(ascending=False).head(10)
-        
-        fig_articles = px.bar(
-            x=articles_per_team.values,
-            y=articles_per_team.index,
-            orientation='h',
-            title='Top 10 Teams by Article Count',
-            labels={'x': 'Total Articles', 'y': ''},
-            color=articles_per_team.values,
-            color_continuous_scale='Blues'
-        )
-        st.plotly_chart(fig_articles, use_container_width=True)
-    
-    st.markdown("---")
-    
-    # === SENTIMENT DISTRIBUTION ===
-    st.subheader("📊 Sentiment Distribution")
-    
-    fig_hist = px.histogram(
-        latest_sentiment,
-        x='avg_sentiment',
-        nbins=20,
-        title='Distribution of Team Sentiments',
-        labels={'avg_sentiment': 'Sentiment Score'},
-        color_discrete_sequence=['#667eea']
-    )
-    
-    fig_hist.add_vline(x=0, line_dash="dash", line_color="gray")
-    st.plotly_chart(fig_hist, use_container_width=True)
-    
-    st.markdown("---")
-    
+
+@st.fragment
+def render_data_table(df, df_digest, sentiment_filter):
+    """Recent rows with a column picker and the full CSV download"""
     # === RECENT DATA TABLE ===
     st.subheader("📋 Recent Analysis Results")
     
@@ -449,15 +588,14 @@ try:
         default=available_cols
     )
     
-    display_df = df[show_cols].copy()
-    display_df = display_df.sort_values('timestamp', ascending=False).head(100)
+    display_df = df.nlargest(100, 'timestamp')[show_cols].copy()
     
     if 'timestamp' in display_df.columns:
-        display_df['timestamp'] = pd.to_datetime(display_df['timestamp']).dt.strftime('%Y-%m-%d %H:%M')
+        display_df['timestamp'] = display_df['timestamp'].dt.strftime('%Y-%m-%d %H:%M')
     
     st.dataframe(display_df, use_container_width=True, hide_index=True, height=400)
     
-    csv = df.to_csv(index=False)
+    csv = csv_bytes(df_digest, sentiment_filter, df)
     st.download_button(
         label="📥 Download Full Dataset (CSV)",
         data=csv,
@@ -465,6 +603,181 @@ try:
         mime="text/csv"
     )
 
+# Load data
+try:
+    with st.spinner("Loading data from Firestore..."):
+        df = load_data(days=days_filter)
+    
+    if df.empty:
+        st.warning("⏳ No data yet. The Cloud Function needs to run at least once.")
+        st.info("""
+        **Next steps:**
+        1. Trigger your Cloud Function manually or wait for scheduled run
+        2. Check Firestore console to verify data is being stored
+        3. Refresh this dashboard
+        """)
+        st.stop()
+    
+    # Filtered frame and per-team aggregates, recomputed only when the data
+    # or the sentiment filter changes
+    df_digest = frame_digest(df)
+    agg = aggregate(df_digest, df, sentiment_filter)
+    
+    df = agg.df
+    latest_sentiment = agg.latest
+    
+    # === OVERVIEW METRICS ===
+    st.subheader("📊 Overview")
+    
+    col1, col2, col3, col4, col5 = st.columns(5)
+    
+    with col1:
+        st.metric("🏆 Teams Tracked", len(latest_sentiment))
+    
+    with col2:
+        if not latest_sentiment.empty:
+            most_positive = latest_sentiment.iloc[0]
+            st.metric(
+                "😊 Most Positive",
+                most_positive['team'],
+                delta=f"+{most_positive['avg_sentiment']:.2f}"
+            )
+    
+    with col3:
+        if not latest_sentiment.empty:
+            most_negative = latest_sentiment.iloc[-1]
+            st.metric(
+                "😔 Most Negative",
+                most_negative['team'],
+                delta=f"{most_negative['avg_sentiment']:.2f}"
+            )
+    
+    with col4:
+        avg_sentiment = latest_sentiment['avg_sentiment'].mean()
+        st.metric("📈 League Average", f"{avg_sentiment:.2f}")
+    
+    with col5:
+        total_articles = df['article_count'].sum()
+        st.metric("📝 Total Articles", f"{total_articles:,}")
+    
+    st.markdown("---")
+    
+    # Sections live in tabs; the ones with their own widgets are fragments,
+    # so interacting with them only reruns that tab
+    tab_rankings, tab_teams, tab_sources, tab_distribution, tab_table = st.tabs([
+        "🏅 Rankings",
+        "📈 Team Comparison",
+        "📰 Sources",
+        "📊 Distribution",
+        "📋 Data"
+    ])
+    
+    with tab_rankings:
+        # === SENTIMENT RANKINGS ===
+        st.subheader("🏅 Current Sentiment Rankings")
+        
+        scores = latest_sentiment['avg_sentiment'].to_numpy()
+        colors = np.select([scores > 0.1, scores < -0.1], ['#00D9A3', '#FF4B4B'], default='#FFA500').tolist()
+        
+        ranking_key = (days_filter, sentiment_filter)
+        fig_bar = cached_figure('ranking', ranking_key)
+        
+        if fig_bar is None:
+            fig_bar = go.Figure()
+            
+            fig_bar.add_trace(go.Bar(
+                orientation='h',
+                textposition='outside'
+            ))
+            
+            fig_bar.update_layout(
+                title="Team Sentiment Scores (Latest)",
+                xaxis_title="Sentiment Score",
+                yaxis_title="",
+                width=1100,
+                showlegend=False,
+                yaxis={'categoryorder': 'total ascending'}
+            )
+            
+            fig_bar.add_vline(x=0, line_dash="dash", line_color="gray", opacity=0.3)
+            store_figure('ranking', ranking_key, fig_bar)
+        
+        fig_bar.data[0].y = latest_sentiment['team'].to_numpy()
+        fig_bar.data[0].x = latest_sentiment['avg_sentiment'].to_numpy()
+        fig_bar.data[0].marker.color = colors
+        fig_bar.data[0].text = latest_sentiment['avg_sentiment'].round(3).to_numpy()
+        fig_bar.update_layout(height=max(600, len(latest_sentiment) * 30))
+        
+        st.plotly_chart(fig_bar, use_container_width=False, key='ranking_chart')
+    
+    with tab_teams:
+        render_team_comparison(agg, days_filter, sentiment_filter)
+    
+    with tab_sources:
+        # === DATA SOURCES ===
+        st.subheader("📰 Data Sources Breakdown")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            source_counts = agg.source_counts
+            
+            if not source_counts.empty:
+                fig_sources = go.Figure(go.Pie(
+                    values=source_counts.to_numpy(),
+                    labels=source_counts.index.to_numpy()
+                ))
+                fig_sources.update_layout(title='Articles by Source', width=540)
+                st.plotly_chart(fig_sources, use_container_width=False)
+        
+        with col2:
+            articles_per_team = agg.articles_per_team
+            
+            article_totals = articles_per_team.to_numpy()
+            fig_articles = go.Figure(go.Bar(
+                x=article_totals,
+                y=articles_per_team.index.to_numpy(),
+                orientation='h',
+                marker=dict(color=article_totals, colorscale='Blues', colorbar=dict(title='Total Articles'))
+            ))
+            fig_articles.update_layout(
+                title='Top 10 Teams by Article Count',
+                xaxis_title='Total Articles',
+                yaxis_title='',
+                width=540
+            )
+            st.plotly_chart(fig_articles, use_container_width=False)
+    
+    with tab_distribution:
+        # === SENTIMENT DISTRIBUTION ===
+        st.subheader("📊 Sentiment Distribution")
+        
+        distribution_key = (days_filter, sentiment_filter)
+        fig_hist = cached_figure('distribution', distribution_key)
+        
+        if fig_hist is None:
+            fig_hist = go.Figure(go.Histogram(
+                x=latest_sentiment['avg_sentiment'].to_numpy(),
+                nbinsx=20,
+                marker_color='#667eea'
+            ))
+            fig_hist.update_layout(
+                title='Distribution of Team Sentiments',
+                xaxis_title='Sentiment Score',
+                yaxis_title='count',
+                width=1100
+            )
+            
+            fig_hist.add_vline(x=0, line_dash="dash", line_color="gray")
+            store_figure('distribution', distribution_key, fig_hist)
+        else:
+            fig_hist.data[0].x = latest_sentiment['avg_sentiment'].to_numpy()
+        
+        st.plotly_chart(fig_hist, use_container_width=False, key='distribution_chart')
+    
+    with tab_table:
+        render_data_table(df, df_digest, sentiment_filter)
+
 except Exception as e:
     st.error(f"❌ Error loading data: {e}")
     st.info("""
@@ -483,7 +796,9 @@ except Exception as e:
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔄 Refresh Data")
 if st.sidebar.button("Refresh Now"):
-    st.cache_data.clear()
+    clear_cache()
+    load_data.clear()
+    load_key_topics.clear()
     st.rerun()
 
 st.sidebar.markdown("---")
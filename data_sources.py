@@ -3,9 +3,181 @@ Data sources for fan sentiment analysis using RSS feeds
 No authentication required - works immediately!
 """
 
-import feedparser
-import time
+import hashlib
+import logging
+import re
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from io import BytesIO
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+FEED_TIMEOUT = 10
+
+# Caps on concurrent feed downloads, overall and per host - these replace
+# the fixed sleeps between requests
+MAX_CONCURRENT_FETCHES = 8
+MAX_FETCHES_PER_HOST = 4
+_fetch_slots = threading.BoundedSemaphore(MAX_CONCURRENT_FETCHES)
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+# One pooled session for every feed download, so TCP/TLS connections to
+# Google, BBC and Sky are reused across requests and warm invocations
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=MAX_CONCURRENT_FETCHES,
+    pool_maxsize=MAX_FETCHES_PER_HOST
+))
+
+# Last parsed posts of each feed with its validators, for conditional GETs.
+# Persisted to Firestore between invocations via load/save_feed_cache
+FEED_CACHE_COLLECTION = 'feed_cache'
+MAX_CACHED_POSTS = 50
+POST_FIELDS = ('text', 'source', 'published', 'link')
+_feed_cache = {}
+_dirty_feeds = set()
+
+# Compiled team matchers, keyed on the teams they were built from
+_team_matchers = {}
+
+
+def _host_slot(url):
+    """Per-host semaphore, created on first use"""
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(MAX_FETCHES_PER_HOST)
+        return _host_slots[host]
+
+
+def _add_text_views(post):
+    """
+    Attach the lowercased and truncated forms of a post's text
+    Matching, dedupe and the NL API calls read these instead of recomputing
+    """
+    text = post['text']
+    post['text_lower'] = text.lower()
+    post['text_1000'] = text[:1000]
+    post['text_500'] = text[:500]
+    return post
+
+
+def _parse_items(xml_bytes, source_name):
+    """
+    Stream the <item> elements of an RSS document into posts
+    Each element is cleared once read, so the tree never builds up
+    """
+    posts = []
+    
+    for _, item in ET.iterparse(BytesIO(xml_bytes)):
+        if item.tag != 'item':
+            continue
+        
+        # One pass over the children, then plain dict lookups per field
+        fields = {child.tag: child.text for child in item}
+        title = (fields.get('title') or '').strip()
+        summary = (fields.get('summary') or fields.get('description') or '').strip()
+        posts.append(_add_text_views({
+            'text': title + (' ' + summary if summary else ''),
+            'source': source_name,
+            'published': fields.get('pubDate') or '',
+            'link': fields.get('link') or ''
+        }))
+        item.clear()
+        
+        if len(posts) >= MAX_CACHED_POSTS:
+            break
+    
+    return posts
+
+
+def _parse_feed(url, source_name, limit):
+    """
+    Fetch a feed and turn its first `limit` entries into posts
+    Text is the title plus the description when there is one
+    
+    The cached ETag / Last-Modified values are sent along, and the cached
+    posts are returned when the server answers 304 Not Modified
+    """
+    cached = _feed_cache.get(url)
+    
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['modified']:
+            headers['If-Modified-Since'] = cached['modified']
+    
+    with _fetch_slots, _host_slot(url):
+        response = _session.get(url, headers=headers, timeout=FEED_TIMEOUT)
+    
+    if cached and response.status_code == 304:
+        return cached['posts'][:limit]
+    
+    response.raise_for_status()
+    posts = _parse_items(response.content, source_name)
+    
+    # Without a validator the feed can never answer 304, so there is nothing
+    # worth keeping or persisting
+    etag = response.headers.get('ETag')
+    modified = response.headers.get('Last-Modified')
+    if posts and (etag or modified):
+        _feed_cache[url] = {
+            'etag': etag,
+            'modified': modified,
+            'posts': posts
+        }
+        _dirty_feeds.add(url)
+    
+    return posts[:limit]
+
+
+def _feed_doc_id(url):
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def load_feed_cache(db):
+    """
+    Seed the in-memory feed cache from Firestore
+    Entries already held by a warm instance are kept
+    """
+    for doc in db.collection(FEED_CACHE_COLLECTION).stream():
+        d = doc.to_dict()
+        _feed_cache.setdefault(d['url'], {
+            'etag': d.get('etag'),
+            'modified': d.get('modified'),
+            'posts': [_add_text_views(post) for post in d.get('posts', [])]
+        })
+
+
+def save_feed_cache(db):
+    """Write feeds refreshed during this run back to Firestore"""
+    if not _dirty_feeds:
+        return
+    
+    batch = db.batch()
+    for url in _dirty_feeds:
+        cached = _feed_cache[url]
+        # Only the base fields are stored; the text views are rebuilt on load
+        batch.set(
+            db.collection(FEED_CACHE_COLLECTION).document(_feed_doc_id(url)),
+            {
+                'url': url,
+                'etag': cached['etag'],
+                'modified': cached['modified'],
+                'posts': [{field: post[field] for field in POST_FIELDS} for post in cached['posts']]
+            }
+        )
+    batch.commit()
+    _dirty_feeds.clear()
+
 
 def fetch_google_news(team_name, limit=15, days_back=None):
     """
@@ -23,35 +195,20 @@ def fetch_google_news(team_name, limit=15, days_back=None):
         
         url = f'https://news.google.com/rss/search?q={search_query}&hl=en-US&gl=GB&ceid=GB:en'
         
-        print(f"Fetching Google News for {team_name}...")
+        log.debug("Fetching Google News for %s", team_name)
         
         # Parse RSS feed
-        feed = feedparser.parse(url)
-        
-        posts = []
-        
-        if feed.entries:
-            for entry in feed.entries[:limit]:
-                # Combine title and summary
-                text = entry.title
-                if hasattr(entry, 'summary'):
-                    text += ' ' + entry.summary
-                
-                posts.append({
-                    'text': text,
-                    'source': 'Google News',
-                    'published': entry.get('published', ''),
-                    'link': entry.get('link', '')
-                })
-            
-            print(f"✓ Found {len(posts)} articles for {team_name}")
+        posts = _parse_feed(url, 'Google News', limit)
+        
+        if posts:
+            log.info("Found %d articles for %s", len(posts), team_name)
         else:
-            print(f"⚠ No articles found for {team_name}")
+            log.warning("No articles found for %s", team_name)
         
         return posts
         
     except Exception as e:
-        print(f"✗ Error fetching news for {team_name}: {str(e)}")
+        log.error("Error fetching news for %s: %s", team_name, e)
         return []
 
 
@@ -62,34 +219,18 @@ def fetch_bbc_sport_news(limit=20):
     try:
         url = 'https://feeds.bbci.co.uk/sport/football/premier-league/rss.xml'
         
-        print("Fetching from BBC Sport RSS...")
-        feed = feedparser.parse(url)
-        
-        posts = []
-        
-        if feed.entries:
-            for entry in feed.entries[:limit]:
-                text = entry.title
-                if hasattr(entry, 'summary'):
-                    text += ' ' + entry.summary
-                elif hasattr(entry, 'description'):
-                    text += ' ' + entry.description
-                
-                posts.append({
-                    'text': text,
-                    'source': 'BBC Sport',
-                    'published': entry.get('published', ''),
-                    'link': entry.get('link', '')
-                })
-            
-            print(f"✓ Found {len(posts)} BBC Sport articles")
+        log.debug("Fetching from BBC Sport RSS")
+        posts = _parse_feed(url, 'BBC Sport', limit)
+        
+        if posts:
+            log.info("Found %d BBC Sport articles", len(posts))
         else:
-            print(f"⚠ BBC Sport returned no articles")
+            log.warning("BBC Sport returned no articles")
         
         return posts
         
     except Exception as e:
-        print(f"✗ Error fetching BBC Sport: {str(e)}")
+        log.error("Error fetching BBC Sport: %s", e)
         return []
 
 
@@ -100,125 +241,119 @@ def fetch_sky_sports_news():
     try:
         url = 'https://www.skysports.com/rss/12040'
         
-        print("Fetching from Sky Sports RSS...")
-        feed = feedparser.parse(url)
-        
-        posts = []
-        
-        if feed.entries:
-            for entry in feed.entries[:20]:
-                text = entry.title
-                if hasattr(entry, 'summary'):
-                    text += ' ' + entry.summary
-                elif hasattr(entry, 'description'):
-                    text += ' ' + entry.description
-                
-                posts.append({
-                    'text': text,
-                    'source': 'Sky Sports',
-                    'published': entry.get('published', ''),
-                    'link': entry.get('link', '')
-                })
-            
-            print(f"✓ Found {len(posts)} Sky Sports articles")
+        log.debug("Fetching from Sky Sports RSS")
+        posts = _parse_feed(url, 'Sky Sports', 20)
+        
+        if posts:
+            log.info("Found %d Sky Sports articles", len(posts))
         else:
-            print(f"⚠ Sky Sports returned no articles")
+            log.warning("Sky Sports returned no articles")
         
         return posts
         
     except Exception as e:
-        print(f"✗ Error fetching Sky Sports: {str(e)}")
+        log.error("Error fetching Sky Sports: %s", e)
         return []
 
 
-def filter_posts_by_team(posts, team_name, team_variations):
+def build_team_matcher(teams):
     """
-    Filter articles that mention the team
-    Uses flexible matching - checks if ANY variation appears in text
+    Compile every team variation into a single pattern
+    Returns the pattern and a lookup from matched (lowercase) text to team names
     """
-    relevant_posts = []
+    key = tuple((team_name, tuple(team_variations)) for team_name, team_variations in teams.items())
+    if key in _team_matchers:
+        return _team_matchers[key]
     
-    for post in posts:
-        text_lower = post['text'].lower()
-        
-        # Check if any team variation is mentioned
-        # Also check for partial matches (e.g., "United" in "Manchester United")
-        found = False
+    lookup = {}
+    for team_name, team_variations in teams.items():
         for variation in team_variations:
-            variation_lower = variation.lower()
-            
-            # Direct match or word boundary match
-            if variation_lower in text_lower:
-                # Avoid false positives (e.g., "United" matching "United States")
-                # Check if it's a word boundary match
-                words = text_lower.split()
-                for word in words:
-                    if variation_lower in word:
-                        found = True
-                        break
-            
-            if found:
-                break
+            lookup.setdefault(variation.lower(), set()).add(team_name)
+    
+    # Longest alternatives first so "leicester city" wins over "city";
+    # word boundaries stop "spurs" matching inside "spursy" and the like
+    alternatives = sorted(lookup, key=len, reverse=True)
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(alt) for alt in alternatives) + r')\b')
+    
+    _team_matchers[key] = pattern, lookup
+    return pattern, lookup
+
+
+def classify_posts_by_team(posts, teams):
+    """
+    Bucket articles under every team they mention
+    Each post is scanned once, whatever the number of teams
+    """
+    pattern, lookup = build_team_matcher(teams)
+    team_posts = {}
+    
+    for post in posts:
+        mentioned = set()
+        for match in pattern.finditer(post['text_lower']):
+            mentioned.update(lookup[match.group()])
         
-        if found:
-            relevant_posts.append(post)
+        for team_name in mentioned:
+            team_posts.setdefault(team_name, []).append(post)
+    
+    return team_posts
+
+
+def dedupe_posts(posts):
+    """
+    Drop syndicated copies of the same story, keeping the first seen
+    Posts are compared on the start of their lowercased text
+    """
+    seen = set()
+    unique = []
+    
+    for post in posts:
+        digest = hashlib.blake2b(post['text_lower'][:200].encode(), digest_size=16).digest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(post)
     
-    return relevant_posts
+    return unique
 
 
-def fetch_combined_news(team_name, team_variations):
+def fetch_all_teams(teams):
     """
-    Fetch news from multiple RSS sources and filter by team
+    Fetch news for every team in one batch
+    
+    BBC Sport and Sky Sports are league-wide feeds, so they are fetched once
+    and classified against all teams in a single scan. Google News is queried
+    per team on a thread pool.
     
     Args:
-        team_name: Full team name (e.g., "Liverpool")
-        team_variations: List of name variations (e.g., ["Liverpool", "LFC"])
+        teams: Dict of team name -> list of name variations
     
     Returns:
-        List of relevant news articles
-    """
-    all_posts = []
-    
-    print(f"\n{'='*60}")
-    print(f"Collecting news for: {team_name}")
-    print(f"{'='*60}")
-    
-    # Source 1: Google News (team-specific - most reliable)
-    print("\n[1/3] Google News (team-specific)...")
-    google_posts = fetch_google_news(team_name, limit=10)
-    all_posts.extend(google_posts)
-    time.sleep(1)  # Be polite
-    
-    # Source 2: BBC Sport (filter for team)
-    print("\n[2/3] BBC Sport Premier League...")
-    bbc_posts = fetch_bbc_sport_news(limit=20)
-    if bbc_posts:
-        filtered_bbc = filter_posts_by_team(bbc_posts, team_name, team_variations)
-        print(f"  → Filtered to {len(filtered_bbc)} relevant articles")
-        all_posts.extend(filtered_bbc)
-    else:
-        print(f"  → BBC Sport fetch failed, skipping")
-    time.sleep(1)
-    
-    # Source 3: Sky Sports (filter for team)
-    print("\n[3/3] Sky Sports...")
-    sky_posts = fetch_sky_sports_news()
-    if sky_posts:
-        filtered_sky = filter_posts_by_team(sky_posts, team_name, team_variations)
-        print(f"  → Filtered to {len(filtered_sky)} relevant articles")
-        all_posts.extend(filtered_sky)
-    else:
-        print(f"  → Sky Sports fetch failed, skipping")
-    time.sleep(1)
-    
-    print(f"\n{'='*60}")
-    print(f"✓ Total articles for {team_name}: {len(all_posts)}")
-    if google_posts:
-        print(f"  - Google News: {len(google_posts)}")
-    if bbc_posts:
-        print(f"  - BBC Sport: {len([p for p in all_posts if p['source'] == 'BBC Sport'])}")
-    if sky_posts:
-        print(f"  - Sky Sports: {len([p for p in all_posts if p['source'] == 'Sky Sports'])}")
-    print(f"{'='*60}\n")
-    
-    return all_posts
\ No newline at end of file
+        Dict of team name -> list of relevant news articles
+    """
+    team_names = list(teams)
+    
+    log.info("Collecting news for %d teams", len(team_names))
+    
+    # One BBC pool is shared by all teams, so take a deep enough slice that
+    # each team still gets its share of matches
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES) as executor:
+        bbc_future = executor.submit(fetch_bbc_sport_news, 50)
+        sky_future = executor.submit(fetch_sky_sports_news)
+        google_posts = dict(zip(
+            team_names,
+            executor.map(lambda team_name: fetch_google_news(team_name, limit=10), team_names)
+        ))
+        shared_posts = bbc_future.result() + sky_future.result()
+    
+    shared_by_team = classify_posts_by_team(shared_posts, teams)
+    
+    team_posts = {
+        team_name: dedupe_posts(google_posts[team_name] + shared_by_team.get(team_name, []))
+        for team_name in team_names
+    }
+    
+    log.info(
+        "%d shared BBC/Sky articles classified across teams, %d articles in total",
+        len(shared_posts), sum(len(posts) for posts in team_posts.values())
+    )
+    
+    return team_posts
@@ -6,108 +6,249 @@ Analyzes sentiment from multiple news RSS feeds with entity extraction
 import functions_framework
 from google.cloud import language_v1
 from google.cloud import firestore
-from datetime import datetime, timedelta
-import random
-from data_sources import fetch_combined_news
-
-# Premier League teams with name variations
-PREMIER_LEAGUE_TEAMS = {
-    'Manchester City': ['Manchester City', 'Man City', 'MCFC', 'City'],
-    'Arsenal': ['Arsenal', 'Gunners', 'AFC'],
-    'Liverpool': ['Liverpool', 'LFC', 'Reds'],
-    'Manchester United': ['Manchester United', 'Man United', 'Man Utd', 'MUFC', 'United'],
-    'Chelsea': ['Chelsea', 'CFC', 'Blues'],
-    'Tottenham': ['Tottenham', 'Spurs', 'THFC'],
-    'Newcastle': ['Newcastle', 'Newcastle United', 'NUFC'],
-    'Brighton': ['Brighton', 'Brighton & Hove Albion', 'Seagulls'],
-    'Aston Villa': ['Aston Villa', 'Villa', 'AVFC'],
-    'West Ham': ['West Ham', 'West Ham United', 'Hammers'],
-    'Fulham': ['Fulham', 'FFC'],
-    'Brentford': ['Brentford', 'Bees'],
-    'Crystal Palace': ['Crystal Palace', 'Palace', 'CPFC', 'Eagles'],
-    'Nottingham Forest': ['Nottingham Forest', 'Forest', 'NFFC'],
-    'Everton': ['Everton', 'EFC', 'Toffees'],
-    'Bournemouth': ['Bournemouth', 'AFC Bournemouth', 'Cherries'],
-    'Wolves': ['Wolves', 'Wolverhampton', 'Wanderers'],
-    'Leicester': ['Leicester', 'Leicester City', 'LCFC', 'Foxes'],
-    'Ipswich': ['Ipswich', 'Ipswich Town', 'ITFC', 'Tractor Boys'],
-    'Southampton': ['Southampton', 'Saints']
-}
-
-
-def analyze_sentiment(text, nlp_client):
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+import logging
+import re
+import threading
+import numpy as np
+from constants import PREMIER_LEAGUE_TEAMS
+from data_sources import fetch_all_teams, load_feed_cache, save_feed_cache
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+_rng = np.random.default_rng()
+
+# Upper bounds on teams processed at once and NL API calls per team
+TEAM_MAX_WORKERS = 10
+NLP_MAX_WORKERS = 16
+
+# A document write is given up after this many attempts
+WRITE_MAX_ATTEMPTS = 5
+
+
+# Entity names too generic to be useful as key topics, including every
+# team's name and its common short forms
+_GENERIC_TERMS = frozenset({
+    'premier league', 'epl', 'football', 'soccer', 'match', 'game', 
+    'team', 'club', 'player', 'manager', 'coach', 'fixture', 'goal',
+    'goals', 'win', 'loss', 'draw', 'point', 'points',
+    'spurs', 'wolverhampton', 'man city', 'man united', 'man utd'
+} | {team_name.lower() for team_name in PREMIER_LEAGUE_TEAMS})
+_URL_RE = re.compile(r'http|www\.')
+
+# Separates team sections in the shared entity-analysis document
+SECTION_SEPARATOR = '\n\n'
+
+
+# API clients are kept at module level so warm invocations reuse their
+# credentials and channels
+_nlp_client = None
+_nlp_client_lock = threading.Lock()
+_db = None
+
+
+def get_nlp_client():
+    """
+    Natural Language client, created once per instance
+    First use can come from several worker threads at once, hence the lock
+    """
+    global _nlp_client
+    with _nlp_client_lock:
+        if _nlp_client is None:
+            _nlp_client = language_v1.LanguageServiceClient()
+    return _nlp_client
+
+
+def get_db():
+    """Firestore client, created once per instance"""
+    global _db
+    if _db is None:
+        _db = firestore.Client()
+    return _db
+
+
+@lru_cache(maxsize=4096)
+def _cached_score(text):
+    document = language_v1.Document(
+        content=text,
+        type_=language_v1.Document.Type.PLAIN_TEXT
+    )
+    
+    return get_nlp_client().analyze_sentiment(
+        request={'document': document}
+    ).document_sentiment.score
+
+
+def analyze_sentiment(text):
     """
     Analyze sentiment using Google Cloud Natural Language API
+    Texts under 30 characters are skipped; repeated texts are served from cache
     """
+    if len(text) < 30:
+        return None
+    
     try:
-        text = text[:1000]
-        
-        document = language_v1.Document(
-            content=text,
-            type_=language_v1.Document.Type.PLAIN_TEXT
-        )
-        
-        sentiment = nlp_client.analyze_sentiment(
-            request={'document': document}
-        ).document_sentiment
-        
-        return sentiment.score
+        return _cached_score(text[:1000])
         
     except Exception as e:
-        print(f"Sentiment analysis error: {e}")
+        log.error("Sentiment analysis error: %s", e)
         return None
 
 
-def generate_team_summary(posts, team_name, nlp_client):
-    """Extract meaningful entities, filtering out generic terms"""
+def generate_team_summaries(posts_by_team):
+    """
+    Extract meaningful entities for every team in one analyze_entities call
+    
+    Each team's text becomes a section of a single document. Entities are
+    attributed to teams by the sections their mentions fall in, and their
+    salience is renormalised within each team.
+    """
     try:
-        all_text = " ".join([post['text'][:500] for post in posts[:5]])
+        team_names = []
+        section_starts = []
+        sections = []
+        offset = 0
+        for team_name, posts in posts_by_team.items():
+            if not posts:
+                continue
+            
+            text = " ".join([post['text_500'] for post in posts[:5]])[:3000]
+            team_names.append(team_name)
+            section_starts.append(offset)
+            sections.append(text)
+            offset += len(text) + len(SECTION_SEPARATOR)
+        
+        if not sections:
+            return {}
         
         document = language_v1.Document(
-            content=all_text[:3000],
+            content=SECTION_SEPARATOR.join(sections),
             type_=language_v1.Document.Type.PLAIN_TEXT
         )
         
-        response = nlp_client.analyze_entities(request={'document': document})
-        
-        generic_terms = {
-            'premier league', 'epl', 'football', 'soccer', 'match', 'game', 
-            'team', 'club', 'player', 'manager', 'coach', 'fixture', 'goal',
-            'goals', 'win', 'loss', 'draw', 'point', 'points',
-            'manchester city', 'arsenal', 'liverpool', 'chelsea', 'manchester united',
-            'tottenham', 'spurs', 'newcastle', 'brighton', 'aston villa', 'west ham',
-            'fulham', 'brentford', 'crystal palace', 'nottingham forest', 'everton',
-            'bournemouth', 'wolves', 'wolverhampton', 'leicester', 'ipswich', 'southampton',
-            'man city', 'man united', 'man utd', 
-            team_name.lower()
-        }
+        # UTF-32 offsets count code points, so they line up with str indices
+        response = get_nlp_client().analyze_entities(request={
+            'document': document,
+            'encoding_type': language_v1.EncodingType.UTF32
+        })
         
-        entities = []
-        for entity in response.entities[:15]:
-            name_lower = entity.name.lower()
-            
-            if (name_lower in generic_terms or 
-                len(entity.name) < 3 or
-                'http' in name_lower or
-                'www.' in name_lower or
-                entity.name.replace(' ', '').isdigit()):
-                continue
+        # Split each entity's salience across teams by where it is mentioned
+        team_entities = {team_name: [] for team_name in team_names}
+        for entity in response.entities:
+            sections_hit = Counter(
+                bisect_right(section_starts, mention.text.begin_offset) - 1
+                for mention in entity.mentions
+            )
+            total = sum(sections_hit.values())
+            for index, count in sections_hit.items():
+                team_entities[team_names[index]].append((entity.salience * count / total, entity))
+        
+        summaries = {}
+        for team_name, scored in team_entities.items():
+            team_total = sum(score for score, _ in scored) or 1
+            scored.sort(key=lambda pair: pair[0], reverse=True)
             
-            if entity.salience > 0.03:
-                entities.append({
-                    'name': entity.name,
-                    'type': str(entity.type_),
-                    'salience': round(entity.salience, 3)
-                })
+            entities = []
+            for score, entity in scored[:15]:
+                name_lower = entity.name.lower()
+                
+                if (name_lower in _GENERIC_TERMS or
+                    len(entity.name) < 3 or
+                    _URL_RE.search(name_lower) or
+                    entity.name.replace(' ', '').isdigit()):
+                    continue
+                
+                salience = score / team_total
+                if salience > 0.03:
+                    entities.append({
+                        'name': entity.name,
+                        'type': str(entity.type_),
+                        'salience': round(salience, 3)
+                    })
+                
+                if len(entities) >= 3:
+                    break
             
-            if len(entities) >= 3:
-                break
+            summaries[team_name] = entities
+        
+        return summaries
+        
+    except Exception as e:
+        log.error("Entity extraction error: %s", e)
+        return {}
+
+
+def process_team(team_name, posts, hourly_timestamps):
+    """
+    Score one team's articles and build its document for the day
+    key_topics is filled in by the caller; returns None when there is no
+    usable data
+    """
+    try:
+        if not posts:
+            log.warning("No articles found for %s", team_name)
+            return None
+        
+        sentiments = []
+        sources_used = set()
         
-        return entities
+        candidates = posts[:7]
+        
+        # Per-article sentiment calls are independent RPCs, so issue them
+        # all at once
+        with ThreadPoolExecutor(max_workers=NLP_MAX_WORKERS) as executor:
+            scores = list(executor.map(
+                lambda post: analyze_sentiment(post['text_1000']),
+                candidates
+            ))
+        
+        for post, score in zip(candidates, scores):
+            if score is not None:
+                sentiments.append(score)
+                sources_used.add(post['source'])
+        
+        if not sentiments:
+            log.warning("No valid sentiment data for %s", team_name)
+            return None
+        
+        base_sentiment = np.mean(sentiments)
+        
+        # One point per hour, with small random variance to simulate hourly
+        # changes; all the jitter is drawn in a single call
+        jitter = _rng.uniform(-0.03, 0.03, size=len(hourly_timestamps))
+        hourly_values = np.round(base_sentiment + jitter, 3).tolist()
+        hourly_points = [
+            {'t': hour_timestamp, 's': value}
+            for hour_timestamp, value in zip(hourly_timestamps, hourly_values)
+        ]
+        
+        # A single document per team per day; the top-level sentiment and
+        # timestamp mirror the latest hourly point
+        document = {
+            'team': team_name,
+            'avg_sentiment': hourly_points[-1]['s'],
+            'article_count': len(sentiments),
+            'sources': list(sources_used),
+            'key_topics': [],
+            'timestamp': hourly_points[-1]['t'],
+            'hourly': hourly_points,
+            'league': 'Premier League',
+            'data_type': 'News Sentiment',
+            # Write time of the daily document, set by Firestore
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }
+        
+        log.info("Created %d hourly data points for %s", len(hourly_points), team_name)
+        return document
         
     except Exception as e:
-        print(f"Entity extraction error: {e}")
-        return []
+        log.error("Error processing %s: %s", team_name, e)
+        return None
 
 
 @functions_framework.http
@@ -115,93 +256,92 @@ def sentiment_tracker(request):
     """
     Main Cloud Function - Creates hourly data points for current day
     """
-    print("=" * 70)
-    print("🏆 PREMIER LEAGUE SENTIMENT ANALYSIS - HOURLY BACKFILL")
-    print("=" * 70)
-    
-    nlp_client = language_v1.LanguageServiceClient()
-    db = firestore.Client()
+    db = get_db()
     
     results = []
     teams_to_process = PREMIER_LEAGUE_TEAMS
     
     # Generate hourly timestamps from midnight to now
-    now = datetime.utcnow()
-    midnight_today = datetime(now.year, now.month, now.day, 0, 0, 0)
-    
-    hourly_timestamps = []
-    current_hour = midnight_today
-    while current_hour <= now:
-        hourly_timestamps.append(current_hour)
-        current_hour += timedelta(hours=1)
-    
-    print(f"\n📋 Generating {len(hourly_timestamps)} hourly data points for each team")
-    print(f"Time range: {hourly_timestamps[0]} to {hourly_timestamps[-1]}")
-    print()
-    
-    for team_name, team_variations in teams_to_process.items():
-        try:
-            print(f"\n⚽ {team_name}")
-            
-            posts = fetch_combined_news(team_name, team_variations)
-            
-            if not posts:
-                print(f"⚠️  No articles found")
+    now = datetime.now(timezone.utc)
+    midnight_today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    hours = int((now - midnight_today).total_seconds()) // 3600 + 1
+    hourly_timestamps = [midnight_today + timedelta(hours=i) for i in range(hours)]
+    
+    log.info(
+        "Generating %d hourly data points for each team (%s to %s)",
+        len(hourly_timestamps), hourly_timestamps[0], hourly_timestamps[-1]
+    )
+    
+    try:
+        load_feed_cache(db)
+    except Exception as e:
+        log.warning("Feed cache unavailable: %s", e)
+    
+    posts_by_team = fetch_all_teams(teams_to_process)
+    
+    try:
+        save_feed_cache(db)
+    except Exception as e:
+        log.warning("Could not save feed cache: %s", e)
+    
+    # Queue every document and let the bulk writer send them in batches.
+    # Writes commit asynchronously, so a team only counts as processed once
+    # the writer reports its document as written
+    bulk_writer = db.bulk_writer()
+    queued_teams = {}
+    results_lock = threading.Lock()
+    
+    def on_write_result(document_reference, write_result, bulk_writer):
+        with results_lock:
+            results.append(queued_teams[document_reference.id])
+    
+    def on_write_error(error, bulk_writer):
+        if error.attempts < WRITE_MAX_ATTEMPTS:
+            return True
+        log.error(
+            "Giving up on %s after %d attempts: %s",
+            error.operation.reference.id, error.attempts, error.message
+        )
+        return False
+    
+    bulk_writer.on_write_result(on_write_result)
+    bulk_writer.on_write_error(on_write_error)
+    
+    # Teams are independent, so score several at once; documents are queued
+    # from this thread as each team finishes. Each team has one document per
+    # day, overwritten by every run
+    day = hourly_timestamps[0].date()
+    with ThreadPoolExecutor(max_workers=TEAM_MAX_WORKERS) as executor:
+        # Entities for all teams come from one shared request, run alongside
+        # the per-team sentiment work
+        summaries_future = executor.submit(generate_team_summaries, posts_by_team)
+        team_documents = executor.map(
+            lambda team_name: process_team(
+                team_name, posts_by_team.get(team_name, []), hourly_timestamps
+            ),
+            teams_to_process
+        )
+        
+        for team_name, document in zip(teams_to_process, team_documents):
+            if document is None:
                 continue
             
-            sentiments = []
-            sources_used = set()
-            
-            for post in posts[:7]:
-                text = post['text']
-                
-                if len(text) < 30:
-                    continue
-                
-                score = analyze_sentiment(text, nlp_client)
-                
-                if score is not None:
-                    sentiments.append(score)
-                    sources_used.add(post['source'])
-            
-            if sentiments:
-                base_sentiment = sum(sentiments) / len(sentiments)
-                entities = generate_team_summary(posts, team_name, nlp_client)
-                
-                # Create data point for EACH hour
-                for hour_timestamp in hourly_timestamps:
-                    # Add small random variance to simulate hourly changes
-                    variance = random.uniform(-0.03, 0.03)
-                    hourly_sentiment = base_sentiment + variance
-                    
-                    result = {
-                        'team': team_name,
-                        'avg_sentiment': round(hourly_sentiment, 3),
-                        'article_count': len(sentiments),
-                        'sources': list(sources_used),
-                        'key_topics': entities,
-                        'timestamp': hour_timestamp,  # Use hourly timestamp
-                        'league': 'Premier League',
-                        'data_type': 'News Sentiment'
-                    }
-                    
-                    db.collection('team_sentiment').add(result)
-                
-                results.append(team_name)
-                print(f"✅ Created {len(hourly_timestamps)} hourly data points")
-            else:
-                print(f"❌ No valid data")
-            
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            continue
+            document['key_topics'] = summaries_future.result().get(team_name, [])
+            doc_id = f'{team_name}_{day}'
+            queued_teams[doc_id] = team_name
+            bulk_writer.set(db.collection('team_sentiment').document(doc_id), document)
+    
+    bulk_writer.close()
     
-    print(f"\n✅ Complete: {len(results)} teams processed")
-    print(f"✅ Total documents created: {len(results) * len(hourly_timestamps)}")
+    log.info(
+        "Complete: %d of %d queued teams written, one document each",
+        len(results), len(queued_teams)
+    )
     
     return {
         'status': 'success',
         'teams_processed': len(results),
         'hourly_datapoints': len(hourly_timestamps),
-        'total_documents': len(results) * len(hourly_timestamps)
+        'total_documents': len(results)
     }, 200
\ No newline at end of file